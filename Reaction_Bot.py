@@ -1,38 +1,81 @@
+import asyncio
 import discord
-import sqlite3
-import nest_asyncio
+import aiosqlite
 import os
+import random
+import sys
 from collections import Counter
+from contextlib import asynccontextmanager
+from cachetools import LRUCache, TTLCache
 
 # --- Configuration ---
 # IMPORTANT: DO NOT hardcode your bot token here in production.
 # Use environment variables for security.
 # Set an environment variable named 'DISCORD_BOT_TOKEN' with your actual bot token.
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
-if not DISCORD_BOT_TOKEN:
-    raise ValueError("DISCORD_BOT_TOKEN environment variable not set.")
 DATABASE_NAME = 'reactions.db'
 
 # Define Discord Intents required for the bot to function.
 intents = discord.Intents.default()
 intents.members = True # Required to get member information for leaderboards
-intents.message_content = True # Required to read message content for commands
 intents.reactions = True # Required to receive reaction add/remove events
 
 # Initialize the Discord client with the specified intents.
 bot = discord.Bot(intents=intents)
+bot.db = None # Long-lived aiosqlite connection for writes, opened in on_ready
+bot.read_db = None # Separate connection for slash command reads, so they never see uncommitted writes
+# (users_rows, messages_rows, events_rows, cursor_rows) batches for _db_writer. Created up
+# front so events that arrive before on_ready are held until the writer starts.
+bot.write_queue = asyncio.Queue()
+# Held for the whole backfill, since on_ready can fire again on reconnect while one is running
+bot.backfill_lock = asyncio.Lock()
+# Channels with a backfill batch that failed to write. The rest of their backfill is
+# abandoned for this run so their checkpoints stay behind the lost rows.
+bot.failed_backfill_channels = set()
 
 # --- Database Setup ---
 
-def setup_database():
+async def open_database() -> aiosqlite.Connection:
     """
-    Connects to the SQLite database and creates necessary tables if they don't exist.
+    Opens an aiosqlite connection to the reactions database.
+    WAL lets the slash command reader run alongside the writer, and
+    synchronous=NORMAL only fsyncs at checkpoints instead of every commit.
+    """
+    db = await aiosqlite.connect(DATABASE_NAME)
+    await db.execute("PRAGMA journal_mode=WAL")
+    await db.execute("PRAGMA synchronous=NORMAL")
+    await db.execute("PRAGMA temp_store=MEMORY")
+    # The FOREIGN KEY clauses are documentation only; enforcing them would cost
+    # three index lookups per event insert. OFF is SQLite's default, but keep it explicit.
+    await db.execute("PRAGMA foreign_keys=OFF")
+    return db
+
+# Connection settings for the duration of a backfill: a 64 MB page cache
+# (negative cache_size is in KiB) and a 256 MB memory map.
+BACKFILL_CACHE_SIZE = -65536
+BACKFILL_MMAP_SIZE = 268435456
+
+@asynccontextmanager
+async def backfill_pragmas(db: aiosqlite.Connection):
+    """Enlarges the page cache and memory map of db while a backfill runs, then restores them."""
+    async with db.execute("PRAGMA cache_size") as cursor:
+        (cache_size,) = await cursor.fetchone()
+    async with db.execute("PRAGMA mmap_size") as cursor:
+        (mmap_size,) = await cursor.fetchone()
+    await db.execute(f"PRAGMA cache_size={BACKFILL_CACHE_SIZE}")
+    await db.execute(f"PRAGMA mmap_size={BACKFILL_MMAP_SIZE}")
+    try:
+        yield
+    finally:
+        await db.execute(f"PRAGMA cache_size={cache_size}")
+        await db.execute(f"PRAGMA mmap_size={mmap_size}")
+
+async def setup_database(db: aiosqlite.Connection):
+    """
+    Creates necessary tables if they don't exist.
     """
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-
     # Create 'users' table
-    cursor.execute('''
+    await db.execute('''
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY,
             username TEXT NOT NULL,
@@ -42,7 +85,7 @@ def setup_database():
     ''')
 
     # Create 'messages' table
-    cursor.execute('''
+    await db.execute('''
         CREATE TABLE IF NOT EXISTS messages (
             message_id INTEGER PRIMARY KEY,
             channel_id INTEGER NOT NULL,
@@ -53,7 +96,7 @@ def setup_database():
     ''')
 
     # Create 'reaction_events' table
-    cursor.execute('''
+    await db.execute('''
         CREATE TABLE IF NOT EXISTS reaction_events (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             reactor_user_id INTEGER NOT NULL,
@@ -70,84 +113,480 @@ def setup_database():
         )
     ''')
 
-    conn.commit()
-    conn.close()
+    # Emoji dimension table, so the aggregates below key on a small integer
+    # instead of repeating the emoji text. emoji_id is 0 for unicode emojis
+    # (rather than NULL) so the UNIQUE constraint applies to them too. Older
+    # events may have stored a custom emoji without its id, giving it a second
+    # key, so the leaderboards group by emoji_name to merge the two.
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS emojis (
+            emoji_key INTEGER PRIMARY KEY,
+            emoji_name TEXT NOT NULL,
+            emoji_id INTEGER NOT NULL,
+            UNIQUE(emoji_name, emoji_id)
+        )
+    ''')
+
+    # Running per-(author, reactor, emoji) and per-(message, emoji) totals, kept
+    # in step with reaction_events so leaderboards never re-aggregate the log.
+    # Rebuilt from the log when first created on an existing database. The create
+    # and rebuild run in one explicit transaction: DDL would otherwise autocommit,
+    # and an interrupted rebuild would leave an empty table that is never rebuilt.
+    await db.execute('BEGIN')
+    async with db.execute("SELECT 1 FROM sqlite_master WHERE name = 'reaction_counts'") as cursor:
+        has_counts = await cursor.fetchone() is not None
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS reaction_counts (
+            guild_id INTEGER NOT NULL,
+            message_author_id INTEGER NOT NULL,
+            reactor_user_id INTEGER NOT NULL,
+            emoji_key INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, message_author_id, reactor_user_id, emoji_key)
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS message_reaction_counts (
+            guild_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            emoji_key INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, message_id, emoji_key)
+        ) WITHOUT ROWID
+    ''')
+    if not has_counts:
+        await db.execute('''
+            INSERT OR IGNORE INTO emojis (emoji_name, emoji_id)
+            SELECT DISTINCT emoji_name, COALESCE(emoji_id, 0) FROM reaction_events
+        ''')
+        await db.execute('''
+            INSERT INTO reaction_counts (guild_id, message_author_id, reactor_user_id, emoji_key, count)
+            SELECT re.guild_id, re.message_author_id, re.reactor_user_id, e.emoji_key,
+                   SUM(CASE WHEN re.event_type = 'add' THEN 1 ELSE -1 END)
+            FROM reaction_events re
+            JOIN emojis e ON e.emoji_name = re.emoji_name AND e.emoji_id = COALESCE(re.emoji_id, 0)
+            WHERE re.guild_id IS NOT NULL
+            GROUP BY re.guild_id, re.message_author_id, re.reactor_user_id, e.emoji_key
+        ''')
+        await db.execute('''
+            INSERT INTO message_reaction_counts (guild_id, message_id, emoji_key, count)
+            SELECT re.guild_id, re.message_id, e.emoji_key,
+                   SUM(CASE WHEN re.event_type = 'add' THEN 1 ELSE -1 END)
+            FROM reaction_events re
+            JOIN emojis e ON e.emoji_name = re.emoji_name AND e.emoji_id = COALESCE(re.emoji_id, 0)
+            WHERE re.guild_id IS NOT NULL
+            GROUP BY re.guild_id, re.message_id, e.emoji_key
+        ''')
+    await db.commit()
+    # Covering indexes: each ends in count so the leaderboard SUMs are answered
+    # from the index alone. The primary keys already cover the per-author queries.
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_rc_cover_reactor ON reaction_counts(guild_id, reactor_user_id, emoji_key, count)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_rc_cover_emoji ON reaction_counts(guild_id, emoji_key, message_author_id, count)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_mrc_cover_emoji ON message_reaction_counts(guild_id, emoji_key, message_id, count)')
+
+    # Newest message each channel has been backfilled through, so restarts
+    # only scan history posted since.
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS backfill_cursor (
+            channel_id INTEGER PRIMARY KEY,
+            last_message_id INTEGER NOT NULL
+        )
+    ''')
+
+    # Gather planner statistics once; later startups let SQLite refresh them as needed
+    async with db.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'") as cursor:
+        has_stats = await cursor.fetchone() is not None
+    if not has_stats:
+        await db.execute('ANALYZE')
+    else:
+        await db.execute('PRAGMA optimize')
+
+    await db.commit()
 
 # --- Helper Functions for Database Interaction ---
 
-def get_db_connection():
-    """Establishes and returns a database connection."""
-    return sqlite3.connect(DATABASE_NAME)
-
-async def update_user_in_db(user: discord.User):
-    """Inserts or updates user information in the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT OR IGNORE INTO users (user_id, username, discriminator) VALUES (?, ?, ?)",
-        (user.id, user.name, user.discriminator)
-    )
-    cursor.execute(
-        "UPDATE users SET username = ?, discriminator = ? WHERE user_id = ?",
-        (user.name, user.discriminator, user.id)
-    )
-    conn.commit()
-    conn.close()
-
-async def update_message_in_db(message: discord.Message):
-    """Inserts or updates message information in the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
+# Rows already known to be current in the database, so repeat reactions
+# from the same users on the same messages skip the upserts entirely.
+user_cache = LRUCache(maxsize=50_000) # (user_id, username, discriminator)
+message_cache = LRUCache(maxsize=200_000) # message_id -> author_id
+# HTTP message fetches, in flight or recently finished, so a burst of reactions on
+# one uncached message shares a single request. Kept apart from message_cache,
+# which write_batch relies on to mean the row is already stored.
+message_fetches = LRUCache(maxsize=1024) # message_id -> Task resolving to the author, or None
+# Every emoji seen stays cached; a server only ever uses a bounded set.
+emoji_key_cache: dict[tuple, int] = {} # (emoji_name, emoji_id or 0) -> emoji_key
+
+# Finished leaderboard embeds keyed by (command name, query params). Rankings barely
+# move within a minute, so entries simply expire rather than being invalidated
+# on every reaction.
+leaderboard_cache = TTLCache(maxsize=1024, ttl=60)
+
+# Skips the write entirely when the stored name is already current.
+UPSERT_USER_SQL = """
+    INSERT INTO users (user_id, username, discriminator) VALUES (?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        username = excluded.username,
+        discriminator = excluded.discriminator
+    WHERE username IS NOT excluded.username OR discriminator IS NOT excluded.discriminator
+"""
+
+# Each entry adds a signed delta to the running total for its key.
+UPSERT_REACTION_COUNT_SQL = """
+    INSERT INTO reaction_counts (guild_id, message_author_id, reactor_user_id, emoji_key, count)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(guild_id, message_author_id, reactor_user_id, emoji_key)
+    DO UPDATE SET count = count + excluded.count
+"""
+UPSERT_MESSAGE_REACTION_COUNT_SQL = """
+    INSERT INTO message_reaction_counts (guild_id, message_id, emoji_key, count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(guild_id, message_id, emoji_key)
+    DO UPDATE SET count = count + excluded.count
+"""
+
+async def resolve_emoji_keys(events_rows: list[tuple]) -> dict[tuple, int]:
+    """
+    Returns the emoji_key for every (emoji_name, emoji_id) in events_rows,
+    inserting emojis seen for the first time. Caller commits, then merges the
+    result into emoji_key_cache so keys from a rolled-back batch are never cached.
+    """
+    emoji_keys = {}
+    for row in events_rows:
+        emoji = (row[3], row[4] or 0)
+        if emoji not in emoji_keys:
+            emoji_keys[emoji] = emoji_key_cache.get(emoji)
+    new_emojis = [emoji for emoji, key in emoji_keys.items() if key is None]
+    if new_emojis:
+        await bot.db.executemany("INSERT OR IGNORE INTO emojis (emoji_name, emoji_id) VALUES (?, ?)", new_emojis)
+        for emoji in new_emojis:
+            async with bot.db.execute(
+                "SELECT emoji_key FROM emojis WHERE emoji_name = ? AND emoji_id = ?", emoji
+            ) as cursor:
+                (emoji_keys[emoji],) = await cursor.fetchone()
+    return emoji_keys
+
+async def update_reaction_counts(events_rows: list[tuple], emoji_keys: dict[tuple, int]):
+    """
+    Folds reaction_events rows into the leaderboard aggregate tables. Caller commits.
+    Events outside a guild are skipped since every leaderboard is per-guild.
+    """
+    pair_counts = Counter()
+    message_counts = Counter()
+    for reactor_id, message_id, author_id, emoji_name, emoji_id, event_type, guild_id in events_rows:
+        if guild_id is None:
+            continue
+        delta = 1 if event_type == 'add' else -1
+        emoji_key = emoji_keys[(emoji_name, emoji_id or 0)]
+        pair_counts[(guild_id, author_id, reactor_id, emoji_key)] += delta
+        message_counts[(guild_id, message_id, emoji_key)] += delta
+    await bot.db.executemany(UPSERT_REACTION_COUNT_SQL, [(*key, count) for key, count in pair_counts.items()])
+    await bot.db.executemany(UPSERT_MESSAGE_REACTION_COUNT_SQL, [(*key, count) for key, count in message_counts.items()])
+
+async def get_message_author_id(payload: discord.RawReactionActionEvent, users_rows: list, messages_rows: list) -> int | None:
+    """
+    Resolves the author of the reacted message, checking the message cache, then
+    the messages table, then the bot's message cache, and only fetching the
+    message over HTTP as a last resort, once per message. Rows for a newly seen message and its
+    author are appended for the writer. Returns None if the message can't be fetched.
+    """
+    author_id = message_cache.get(payload.message_id)
+    if author_id is not None:
+        return author_id
+    if bot.read_db is not None: # Not open yet for events that arrive before on_ready
+        async with bot.read_db.execute(
+            "SELECT author_id FROM messages WHERE message_id = ?", (payload.message_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row:
+            message_cache[payload.message_id] = row[0]
+            return row[0]
+
+    message = bot.get_message(payload.message_id)
+    if message is not None:
+        author = message.author
+    else:
+        fetch = message_fetches.get(payload.message_id)
+        if fetch is None:
+            fetch = asyncio.create_task(_fetch_message_author(payload.channel_id, payload.message_id))
+            message_fetches[payload.message_id] = fetch
+        author = await fetch
+        if author is None:
+            return None
+    user_row = (author.id, author.name, author.discriminator)
+    if user_cache.get(user_row) is None:
+        users_rows.append(user_row)
+    messages_rows.append((payload.message_id, payload.channel_id, payload.guild_id, author.id))
+    return author.id
+
+async def _fetch_message_author(channel_id: int, message_id: int):
+    """Fetches a message over HTTP and returns its author, or None if it can't be fetched."""
+    author = None
+    try:
+        channel = bot.get_partial_messageable(channel_id)
+        message = await channel.fetch_message(message_id)
+        author = message.author
+    except Exception as e:
+        print(f"Could not fetch message {message_id}: {e}")
+    finally:
+        if author is None:
+            message_fetches.pop(message_id, None) # Let a later reaction retry
+    return author
+
+async def record_raw_reaction(payload: discord.RawReactionActionEvent, event_type: str):
+    """Queues a reaction add/remove event for the database writer."""
+    if payload.guild_id is None:
+        return  # Leaderboards are per-server, so DM reactions aren't tracked
+
+    users_rows, messages_rows = [], []
+    author_id = await get_message_author_id(payload, users_rows, messages_rows)
+    if author_id is None:
+        print(f"Could not determine author for message {payload.message_id}. Skipping reaction event.")
+        return
+
+    # payload.member is only sent for adds; fall back to the user cache for removes
+    reactor = payload.member or bot.get_user(payload.user_id)
+    if reactor is not None:
+        user_row = (reactor.id, reactor.name, reactor.discriminator)
+        if user_cache.get(user_row) is None:
+            users_rows.append(user_row)
+
+    emoji = payload.emoji
+    emoji_name = getattr(emoji, 'name', None) or str(emoji)
+    emoji_id = getattr(emoji, 'id', None)
+
+    print(f'Reaction {event_type}: {emoji_name} by {payload.user_id} on message {payload.message_id}')
+    events_rows = [(payload.user_id, payload.message_id, author_id, emoji_name, emoji_id, event_type, payload.guild_id)]
+    bot.write_queue.put_nowait((users_rows, messages_rows, events_rows, []))
+
+# Rows buffered per backfill batch before it's handed to the writer.
+BACKFILL_BATCH_SIZE = 500
+# Backfill scans pause while this many batches are waiting to be written.
+BACKFILL_MAX_QUEUED_BATCHES = 16
+# The writer commits once it has this many queued batches, or after this many
+# seconds from the first one, whichever comes first.
+WRITE_BATCH_MAX_ITEMS = 256
+WRITE_BATCH_MAX_DELAY = 0.1
+# SQLite caps bound parameters per statement at 999, and each event row binds 7.
+REACTION_EVENT_COLUMNS = 7
+REACTION_EVENTS_PER_INSERT = 999 // REACTION_EVENT_COLUMNS
+
+async def insert_reaction_events(rows: list[tuple]):
+    """Inserts reaction event rows using multi-row VALUES statements. Caller commits."""
+    placeholders = "(" + ", ".join("?" * REACTION_EVENT_COLUMNS) + ")"
+    for start in range(0, len(rows), REACTION_EVENTS_PER_INSERT):
+        chunk = rows[start:start + REACTION_EVENTS_PER_INSERT]
+        await bot.db.execute(
+            "INSERT INTO reaction_events (reactor_user_id, message_id, message_author_id, emoji_name, emoji_id, event_type, guild_id) VALUES "
+            + ", ".join([placeholders] * len(chunk)),
+            [value for row in chunk for value in row]
+        )
+
+# Cursors only move forward, even if batches for one channel land together.
+UPSERT_BACKFILL_CURSOR_SQL = """
+    INSERT INTO backfill_cursor (channel_id, last_message_id) VALUES (?, ?)
+    ON CONFLICT(channel_id) DO UPDATE SET
+        last_message_id = MAX(last_message_id, excluded.last_message_id)
+"""
+
+async def write_batch(users_rows: list, messages_rows: list, events_rows: list, cursor_rows: list):
+    """
+    Writes the given rows, and any backfill checkpoints covering them, in a single transaction.
+    The same users and messages repeat heavily within a batch, so they're
+    reduced to one row per id (latest wins) and cached rows are dropped before
+    hitting SQLite. Every event row is kept since each one is a distinct fact.
+    """
+    if not events_rows and not cursor_rows:
+        return
+    users = {row[0]: row for row in users_rows if user_cache.get(row) is None}
+    messages = {row[0]: row for row in messages_rows if message_cache.get(row[0]) is None}
+    await bot.db.executemany(UPSERT_USER_SQL, users.values())
+    await bot.db.executemany(
         "INSERT OR IGNORE INTO messages (message_id, channel_id, guild_id, author_id) VALUES (?, ?, ?, ?)",
-        (message.id, message.channel.id, message.guild.id, message.author.id)
-    )
-    conn.commit()
-    conn.close()
-
-async def record_reaction_event(
-    reactor: discord.User,
-    message: discord.Message,
-    emoji: discord.Emoji | str,
-    event_type: str
-):
-    """Records a reaction add/remove event in the database."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Ensure the reactor and message author are in the users table
-    await update_user_in_db(reactor)
-    await update_user_in_db(message.author)
-    await update_message_in_db(message)
-
-    emoji_name = str(emoji) if isinstance(emoji, str) else emoji.name
-    emoji_id = emoji.id if isinstance(emoji, discord.Emoji) else None
-
-    # Get guild_id from message context
-    guild_id = message.guild.id if message.guild else None
-
-    cursor.execute(
-        "INSERT INTO reaction_events (reactor_user_id, message_id, message_author_id, emoji_name, emoji_id, event_type, guild_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (reactor.id, message.id, message.author.id, emoji_name, emoji_id, event_type, guild_id)
+        messages.values()
     )
-    conn.commit()
-    conn.close()
+    await insert_reaction_events(events_rows)
+    emoji_keys = await resolve_emoji_keys(events_rows)
+    await update_reaction_counts(events_rows, emoji_keys)
+    await bot.db.executemany(UPSERT_BACKFILL_CURSOR_SQL, cursor_rows)
+    await bot.db.commit()
+    emoji_key_cache.update(emoji_keys)
+    for user_row in users.values():
+        user_cache[user_row] = True
+    for message_id, message_row in messages.items():
+        message_cache[message_id] = message_row[3]
+
+async def _db_writer():
+    """
+    Single consumer of bot.write_queue. Coalesces queued live events and
+    backfill batches into one transaction, so SQLite only ever has one writer
+    and a reaction storm costs one commit per batch instead of one per event.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batches = [await bot.write_queue.get()]
+        deadline = loop.time() + WRITE_BATCH_MAX_DELAY
+        while len(batches) < WRITE_BATCH_MAX_ITEMS:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batches.append(await asyncio.wait_for(bot.write_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Batches queued by a channel whose backfill already lost a batch are dropped
+        pending = [batch for batch in batches if _backfill_channel_id(batch) not in bot.failed_backfill_channels]
+        users_rows, messages_rows, events_rows, cursor_rows = [], [], [], []
+        for batch_users, batch_messages, batch_events, batch_cursors in pending:
+            users_rows.extend(batch_users)
+            messages_rows.extend(batch_messages)
+            events_rows.extend(batch_events)
+            cursor_rows.extend(batch_cursors)
+        try:
+            await write_batch(users_rows, messages_rows, events_rows, cursor_rows)
+        except Exception as e:
+            await bot.db.rollback()
+            print(f"Error writing {len(events_rows)} reaction events, retrying batch by batch: {e}")
+            await _write_batches_individually(pending)
+        finally:
+            for _ in batches:
+                bot.write_queue.task_done()
+
+def _backfill_channel_id(batch: tuple) -> int | None:
+    """Returns the channel a backfill batch checkpoints, or None for a batch of live events."""
+    cursor_rows = batch[3]
+    return cursor_rows[0][0] if cursor_rows else None
+
+async def _write_batches_individually(batches: list[tuple]):
+    """
+    Writes each batch in its own transaction after a coalesced write failed, so
+    one bad batch doesn't take the rest down with it. A backfill batch that still
+    fails marks its channel as failed, since a later batch from the same channel
+    would otherwise move the checkpoint past the lost rows.
+    """
+    for batch in batches:
+        channel_id = _backfill_channel_id(batch)
+        if channel_id in bot.failed_backfill_channels:
+            continue
+        try:
+            await write_batch(*batch)
+        except Exception as e:
+            await bot.db.rollback()
+            print(f"Error writing {len(batch[2])} reaction events: {e}")
+            if channel_id is not None:
+                bot.failed_backfill_channels.add(channel_id)
 
-async def backfill_reactions(guild):
-    print(f"Backfilling reactions for guild: {guild.name}")
-    for channel in guild.text_channels:
+# Channels whose history is fetched concurrently during a backfill.
+BACKFILL_CHANNEL_CONCURRENCY = 8
+# Messages requested per history call; 100 is Discord's per-request maximum.
+HISTORY_PAGE_SIZE = 100
+
+async def with_backoff(coro_factory, tries: int = 6, base: float = 1.0, cap: float = 60.0):
+    """
+    Awaits coro_factory(), retrying on Discord 429 responses with jittered
+    exponential backoff. The jitter keeps concurrent channel scans from
+    retrying in lockstep. Other errors, and the final failed attempt, propagate.
+    """
+    for attempt in range(tries):
+        try:
+            return await coro_factory()
+        except discord.HTTPException as e:
+            if e.status != 429 or attempt == tries - 1:
+                raise
+            delay = min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+            retry_after = getattr(e, 'retry_after', None) or e.response.headers.get('Retry-After')
+            if retry_after:
+                delay = max(delay, float(retry_after))
+            print(f"Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{tries})")
+            await asyncio.sleep(delay)
+
+async def _queue_backfill_batch(batch: tuple):
+    """Hands a backfill batch to the writer, waiting for it to catch up if it's behind."""
+    if bot.write_queue.qsize() >= BACKFILL_MAX_QUEUED_BATCHES:
+        await bot.write_queue.join()
+    bot.write_queue.put_nowait(batch)
+
+async def _known_message_ids(message_ids: list[int]) -> set[int]:
+    """
+    Returns which of message_ids are already in the messages table. Their
+    reactions were recorded live while the bot was online, so rescanning them
+    would count each reaction a second time.
+    """
+    if not message_ids:
+        return set()
+    async with bot.read_db.execute(
+        f"SELECT message_id FROM messages WHERE message_id IN ({', '.join('?' * len(message_ids))})", message_ids
+    ) as cursor:
+        return {row[0] for row in await cursor.fetchall()}
+
+async def _backfill_channel(channel, sem: asyncio.Semaphore):
+    """
+    Scans one channel's history since its backfill checkpoint and queues its rows
+    for the database writer, at least once per history page. Each queued batch
+    carries the checkpoint for the newest message it covers, so the cursor
+    commits together with the rows.
+    """
+    guild = channel.guild
+    async with sem:
+        users_rows, messages_rows, events_rows = [], [], []
         try:
-            async for message in channel.history(limit=None, oldest_first=True):
-                for reaction in message.reactions:
-                    async for user in reaction.users():
-                        if user.bot:
-                            continue  # Skip bot users
-                        # Check if this reaction is already in the DB (optional, for idempotency)
-                        await record_reaction_event(user, message, reaction.emoji, 'add')
+            async with bot.read_db.execute(
+                "SELECT last_message_id FROM backfill_cursor WHERE channel_id = ?", (channel.id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            last_message_id = row[0] if row else None
+            # Page through history explicitly so a rate-limited page can be
+            # retried on its own instead of restarting the whole channel.
+            after = discord.Object(id=last_message_id) if last_message_id else None
+            while True:
+                if channel.id in bot.failed_backfill_channels:
+                    print(f"Stopping backfill of channel {channel.name} after a failed write")
+                    return
+                page = await with_backoff(
+                    lambda: channel.history(limit=HISTORY_PAGE_SIZE, after=after, oldest_first=True).flatten()
+                )
+                known_ids = await _known_message_ids([message.id for message in page if message.reactions])
+                for message in page:
+                    last_message_id = message.id
+                    if not message.reactions or message.id in known_ids:
+                        continue
+                    author = message.author
+                    users_rows.append((author.id, author.name, author.discriminator))
+                    messages_rows.append((message.id, channel.id, guild.id, author.id))
+                    for reaction in message.reactions:
+                        if reaction.me and reaction.count == 1:
+                            continue  # Only this bot reacted; skip the users request
+                        emoji = reaction.emoji
+                        emoji_name = getattr(emoji, 'name', None) or str(emoji)
+                        emoji_id = getattr(emoji, 'id', None)
+                        users = [user for user in await with_backoff(lambda: reaction.users().flatten()) if not user.bot]
+                        for user in users:
+                            users_rows.append((user.id, user.name, user.discriminator))
+                            events_rows.append((user.id, message.id, author.id, emoji_name, emoji_id, 'add', guild.id))
+                    if len(events_rows) >= BACKFILL_BATCH_SIZE:
+                        await _queue_backfill_batch((users_rows, messages_rows, events_rows, [(channel.id, last_message_id)]))
+                        users_rows, messages_rows, events_rows = [], [], []
+                if page:
+                    # Checkpoint every page, even one without reactions, so a
+                    # restart never rescans a long quiet channel from the start.
+                    await _queue_backfill_batch((users_rows, messages_rows, events_rows, [(channel.id, last_message_id)]))
+                    users_rows, messages_rows, events_rows = [], [], []
+                if len(page) < HISTORY_PAGE_SIZE:
+                    break
+                after = page[-1]
             print(f"Finished backfilling channel: {channel.name}")
         except Exception as e:
+            # Rows buffered since the last queued batch are dropped
             print(f"Error in channel {channel.name}: {e}")
 
+async def backfill_reactions(guild):
+    print(f"Backfilling reactions for guild: {guild.name}")
+    sem = asyncio.Semaphore(BACKFILL_CHANNEL_CONCURRENCY)
+    await asyncio.gather(
+        *[_backfill_channel(channel, sem) for channel in guild.text_channels],
+        return_exceptions=True
+    )
+
 # --- Bot Events ---
 
 @bot.event
@@ -158,51 +597,102 @@ async def on_ready():
     """
     print(f'Logged in as {bot.user} (ID: {bot.user.id})')
     print('------')
-    setup_database() # Ensure database is set up on bot start
+    if bot.db is None: # on_ready fires again on reconnect; keep the existing connections
+        db = await open_database()
+        try:
+            await setup_database(db) # Ensure database is set up on bot start
+        except Exception:
+            # Leave bot.db unset so the next on_ready runs setup again
+            await db.rollback()
+            await db.close()
+            raise
+        bot.db = db
+        bot.read_db = await open_database()
+        bot.db_writer = asyncio.create_task(_db_writer())
     print('Database setup complete.')
-    for guild in bot.guilds:
-        await backfill_reactions(guild)
+    # A second backfill started mid-run would rescan from the same uncommitted
+    # checkpoints and count those reactions twice, so wait for the first to finish.
+    async with bot.backfill_lock, backfill_pragmas(bot.db):
+        bot.failed_backfill_channels.clear() # Retry them from their last committed checkpoint
+        for guild in bot.guilds:
+            await backfill_reactions(guild)
+        await bot.write_queue.join() # Let the writer catch up before restoring settings
     print('Backfill complete.')
 
 @bot.event
-async def on_reaction_add(reaction: discord.Reaction, user: discord.User):
+async def on_raw_reaction_add(payload: discord.RawReactionActionEvent):
     """
-    Event that fires when a reaction is added to a message.
+    Event that fires when a reaction is added to a message, cached or not.
     Records the reaction event in the database.
     """
-    if user == bot.user: # Ignore reactions from the bot itself
+    if payload.user_id == bot.user.id: # Ignore reactions from the bot itself
         return
-
-    # No partial message check or fetch
-
-    # Ensure message author is available
-    if reaction.message.author is None:
-        print(f"Could not determine author for message {reaction.message.id}. Skipping reaction event.")
-        return
-
-    print(f'Reaction added: {reaction.emoji} by {user} on message by {reaction.message.author}')
-    await record_reaction_event(user, reaction.message, reaction.emoji, 'add')
+    await record_raw_reaction(payload, 'add')
 
 @bot.event
-async def on_reaction_remove(reaction: discord.Reaction, user: discord.User):
-    print("on_reaction_add event fired")
+async def on_raw_reaction_remove(payload: discord.RawReactionActionEvent):
     """
-    Event that fires when a reaction is removed from a message.
+    Event that fires when a reaction is removed from a message, cached or not.
     Records the removal event in the database.
     """
-    if user == bot.user: # Ignore reactions from the bot itself
-        return
-
-    # Ensure message author is available after fetching
-    if reaction.message.author is None:
-        print(f"Could not determine author for message {reaction.message.id}. Skipping reaction event.")
+    if payload.user_id == bot.user.id: # Ignore reactions from the bot itself
         return
-
-    print(f'Reaction removed: {reaction.emoji} by {user} from message by {reaction.message.author}')
-    await record_reaction_event(user, reaction.message, reaction.emoji, 'remove')
+    await record_raw_reaction(payload, 'remove')
 
 # --- Slash Commands ---
 
+def display_name(username: str, discriminator: str) -> str:
+    """Formats a stored username, adding the discriminator for legacy accounts."""
+    return f"{username}#{discriminator}" if discriminator != "0" else username
+
+def _user_row_formatter(label: str):
+    """Returns a row formatter for (username, discriminator, total) rows."""
+    def format_row(rank: int, row: tuple) -> tuple[str, str]:
+        username, discriminator, total = row
+        return f"#{rank} {display_name(username, discriminator)}", f"{label}: {total}"
+    return format_row
+
+def _fmt_emoji_row(rank: int, row: tuple) -> tuple[str, str]:
+    emoji_name, emoji_count = row
+    return f"#{rank} {emoji_name}", f"Count: {emoji_count}"
+
+def _fmt_message_row(rank: int, row: tuple) -> tuple[str, str]:
+    message_id, username, discriminator, reaction_count = row
+    return f"#{rank} by {display_name(username, discriminator)}", f"Message ID: `{message_id}`\nReactions: {reaction_count}"
+
+def build_leaderboard_embed(title: str, color: discord.Color, rows: list, row_formatter, description: str = None) -> discord.Embed:
+    """Builds a leaderboard embed with one field per row, as formatted by row_formatter(rank, row)."""
+    embed = discord.Embed(title=title, description=description, color=color)
+    add_field = embed.add_field
+    for rank, row in enumerate(rows, start=1):
+        name, value = row_formatter(rank, row)
+        add_field(name=name, value=value, inline=False)
+    return embed
+
+async def leaderboard_embed(
+    command_name: str,
+    sql: str,
+    params: tuple,
+    title: str,
+    color: discord.Color,
+    row_formatter,
+    description: str = None
+) -> discord.Embed | None:
+    """
+    Returns the finished leaderboard embed for a query, reusing the cached one
+    if it was built recently. Returns None if the query has no rows.
+    """
+    key = (command_name, *params)
+    embed = leaderboard_cache.get(key)
+    if embed is None:
+        async with bot.read_db.execute(sql, params) as cursor:
+            results = await cursor.fetchall()
+        if not results:
+            return None
+        embed = build_leaderboard_embed(title, color, results, row_formatter, description)
+        leaderboard_cache[key] = embed
+    return embed
+
 @bot.slash_command(name="topusers", description="Shows the top 10 users by total reactions received.")
 async def topreactionsreceived(ctx: discord.ApplicationContext):
     """
@@ -214,47 +704,32 @@ async def topreactionsreceived(ctx: discord.ApplicationContext):
         await ctx.followup.send("This command can only be used in a server.")
         return
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''
+    embed = await leaderboard_embed(ctx.command.name, '''
         SELECT
             u.username,
             u.discriminator,
-            SUM(CASE WHEN re.event_type = 'add' THEN 1 ELSE -1 END) AS total_reactions
+            SUM(rc.count) AS total_reactions
         FROM
-            reaction_events re
+            reaction_counts rc
         JOIN
-            users u ON re.message_author_id = u.user_id
+            users u ON rc.message_author_id = u.user_id
         WHERE
-            re.guild_id = ?
+            rc.guild_id = ?
         GROUP BY
             u.user_id
         ORDER BY
             total_reactions DESC
         LIMIT 10
-    ''', (ctx.guild.id,))
-
-    results = cursor.fetchall()
-    conn.close()
-
-    if not results:
-        await ctx.followup.send("No reaction data available yet for this server.")
-        return
-
-    embed = discord.Embed(
+    ''', (ctx.guild.id,),
         title="🏆 Top 10 Users by Reactions Received 🏆",
         description="Here are the users with the most reactions received:",
-        color=discord.Color.gold()
+        color=discord.Color.gold(),
+        row_formatter=_user_row_formatter("Total Reactions")
     )
 
-    for i, (username, discriminator, total_reactions) in enumerate(results):
-        display_name = f"{username}#{discriminator}" if discriminator != "0" else username
-        embed.add_field(
-            name=f"#{i+1} {display_name}",
-            value=f"Total Reactions: {total_reactions}",
-            inline=False
-        )
+    if embed is None:
+        await ctx.followup.send("No reaction data available yet for this server.")
+        return
 
     await ctx.followup.send(embed=embed)
 
@@ -269,43 +744,31 @@ async def myusedreactions(ctx: discord.ApplicationContext):
         await ctx.followup.send("This command can only be used in a server.")
         return
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''
+    embed = await leaderboard_embed(ctx.command.name, '''
         SELECT
-            emoji_name,
-            SUM(CASE WHEN event_type = 'add' THEN 1 ELSE -1 END) AS emoji_count
+            e.emoji_name,
+            SUM(rc.count) AS emoji_count
         FROM
-            reaction_events
+            reaction_counts rc
+        JOIN
+            emojis e ON rc.emoji_key = e.emoji_key
         WHERE
-            reactor_user_id = ? AND guild_id = ?
+            rc.reactor_user_id = ? AND rc.guild_id = ?
         GROUP BY
-            emoji_name
+            e.emoji_name
         ORDER BY
             emoji_count DESC
         LIMIT 10
-    ''', (ctx.author.id, ctx.guild.id))
-
-    results = cursor.fetchall()
-    conn.close()
-
-    if not results:
-        await ctx.followup.send("You haven't sent any tracked reactions yet in this server.")
-        return
-
-    embed = discord.Embed(
+    ''', (ctx.author.id, ctx.guild.id),
         title=f"✨ {ctx.author.display_name}'s Top 10 Most Used Reactions ✨",
         description="Here are the reactions you've sent the most:",
-        color=discord.Color.blue()
+        color=discord.Color.blue(),
+        row_formatter=_fmt_emoji_row
     )
 
-    for i, (emoji_name, emoji_count) in enumerate(results):
-        embed.add_field(
-            name=f"#{i+1} {emoji_name}",
-            value=f"Count: {emoji_count}",
-            inline=False
-        )
+    if embed is None:
+        await ctx.followup.send("You haven't sent any tracked reactions yet in this server.")
+        return
 
     await ctx.followup.send(embed=embed)
 
@@ -321,25 +784,6 @@ async def myusedreactions(ctx: discord.ApplicationContext):
 #
 # The setup_database() function at the top has been updated to include it for new databases.
 
-# --- Placeholder for Other Commands ---
-# (Same as before, implement these using similar database query patterns)
-
-# --- Run the Bot ---
-
-if __name__ == "__main__":
-    if DISCORD_BOT_TOKEN is None:
-        print("ERROR: DISCORD_BOT_TOKEN environment variable not set.")
-        print("Please set the 'DISCORD_BOT_TOKEN' environment variable with your actual bot token.")
-        print("Example (Linux/macOS): export DISCORD_BOT_TOKEN='YOUR_NEW_TOKEN_HERE'")
-        print("Example (Windows Cmd): set DISCORD_BOT_TOKEN=YOUR_NEW_TOKEN_HERE")
-        print("Example (Windows PowerShell): $env:DISCORD_BOT_TOKEN='YOUR_NEW_TOKEN_HERE'")
-        print("You can get a new token from the Discord Developer Portal after resetting the old one.")
-    
-        
-
-
-
-
 @bot.slash_command(name="topemojiusers", description="Shows the top 10 users by reactions received for a specific emoji.")
 async def top_emoji_users(ctx: discord.ApplicationContext, emoji: str):
     """
@@ -350,43 +794,31 @@ async def top_emoji_users(ctx: discord.ApplicationContext, emoji: str):
         await ctx.followup.send("This command can only be used in a server.")
         return
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    embed = await leaderboard_embed(ctx.command.name, '''
         SELECT
             u.username,
             u.discriminator,
-            SUM(CASE WHEN re.event_type = 'add' THEN 1 ELSE -1 END) AS emoji_reactions
+            SUM(rc.count) AS emoji_reactions
         FROM
-            reaction_events re
+            reaction_counts rc
         JOIN
-            users u ON re.message_author_id = u.user_id
+            users u ON rc.message_author_id = u.user_id
         WHERE
-            re.guild_id = ? AND re.emoji_name = ?
+            rc.guild_id = ? AND rc.emoji_key IN (SELECT emoji_key FROM emojis WHERE emoji_name = ?)
         GROUP BY
             u.user_id
         ORDER BY
             emoji_reactions DESC
         LIMIT 10
-    ''', (ctx.guild.id, emoji))
-    results = cursor.fetchall()
-    conn.close()
+    ''', (ctx.guild.id, emoji),
+        title=f"🏆 Top 10 Users by '{emoji}' Reactions Received 🏆",
+        color=discord.Color.orange(),
+        row_formatter=_user_row_formatter(f"Total '{emoji}' Reactions")
+    )
 
-    if not results:
+    if embed is None:
         await ctx.followup.send(f"No reaction data for emoji {emoji} yet.")
         return
-
-    embed = discord.Embed(
-        title=f"🏆 Top 10 Users by '{emoji}' Reactions Received 🏆",
-        color=discord.Color.orange()
-    )
-    for i, (username, discriminator, emoji_reactions) in enumerate(results):
-        display_name = f"{username}#{discriminator}" if discriminator != "0" else username
-        embed.add_field(
-            name=f"#{i+1} {display_name}",
-            value=f"Total '{emoji}' Reactions: {emoji_reactions}",
-            inline=False
-        )
     await ctx.followup.send(embed=embed)
 
 @bot.slash_command(name="servertopreactions", description="Shows the server's top 10 most used reactions.")
@@ -399,39 +831,30 @@ async def server_top_reactions(ctx: discord.ApplicationContext):
         await ctx.followup.send("This command can only be used in a server.")
         return
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    embed = await leaderboard_embed(ctx.command.name, '''
         SELECT
-            emoji_name,
-            SUM(CASE WHEN event_type = 'add' THEN 1 ELSE -1 END) AS emoji_count
+            e.emoji_name,
+            SUM(rc.count) AS emoji_count
         FROM
-            reaction_events
+            reaction_counts rc
+        JOIN
+            emojis e ON rc.emoji_key = e.emoji_key
         WHERE
-            guild_id = ?
+            rc.guild_id = ?
         GROUP BY
-            emoji_name
+            e.emoji_name
         ORDER BY
             emoji_count DESC
         LIMIT 10
-    ''', (ctx.guild.id,))
-    results = cursor.fetchall()
-    conn.close()
+    ''', (ctx.guild.id,),
+        title="🔥 Server's Top 10 Most Used Reactions 🔥",
+        color=discord.Color.red(),
+        row_formatter=_fmt_emoji_row
+    )
 
-    if not results:
+    if embed is None:
         await ctx.followup.send("No reaction data available yet for this server.")
         return
-
-    embed = discord.Embed(
-        title="🔥 Server's Top 10 Most Used Reactions 🔥",
-        color=discord.Color.red()
-    )
-    for i, (emoji_name, emoji_count) in enumerate(results):
-        embed.add_field(
-            name=f"#{i+1} {emoji_name}",
-            value=f"Count: {emoji_count}",
-            inline=False
-        )
     await ctx.followup.send(embed=embed)
 
 @bot.slash_command(name="usertopreceived", description="Shows a user's top 10 most received reactions.")
@@ -446,39 +869,30 @@ async def user_top_received(ctx: discord.ApplicationContext, user: discord.User
 
     target_user = user or ctx.author
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    embed = await leaderboard_embed(ctx.command.name, '''
         SELECT
-            emoji_name,
-            SUM(CASE WHEN event_type = 'add' THEN 1 ELSE -1 END) AS emoji_count
+            e.emoji_name,
+            SUM(rc.count) AS emoji_count
         FROM
-            reaction_events
+            reaction_counts rc
+        JOIN
+            emojis e ON rc.emoji_key = e.emoji_key
         WHERE
-            message_author_id = ? AND guild_id = ?
+            rc.message_author_id = ? AND rc.guild_id = ?
         GROUP BY
-            emoji_name
+            e.emoji_name
         ORDER BY
             emoji_count DESC
         LIMIT 10
-    ''', (target_user.id, ctx.guild.id))
-    results = cursor.fetchall()
-    conn.close()
+    ''', (target_user.id, ctx.guild.id),
+        title=f"🎉 {target_user.display_name}'s Top 10 Most Received Reactions 🎉",
+        color=discord.Color.green(),
+        row_formatter=_fmt_emoji_row
+    )
 
-    if not results:
+    if embed is None:
         await ctx.followup.send(f"No reactions received yet for {target_user.display_name}.")
         return
-
-    embed = discord.Embed(
-        title=f"🎉 {target_user.display_name}'s Top 10 Most Received Reactions 🎉",
-        color=discord.Color.green()
-    )
-    for i, (emoji_name, emoji_count) in enumerate(results):
-        embed.add_field(
-            name=f"#{i+1} {emoji_name}",
-            value=f"Count: {emoji_count}",
-            inline=False
-        )
     await ctx.followup.send(embed=embed)
 
 @bot.slash_command(name="topmessages", description="Shows the top 10 messages with the most reactions (optionally for a specific emoji).")
@@ -491,74 +905,74 @@ async def top_messages(ctx: discord.ApplicationContext, emoji: str = None):
         await ctx.followup.send("This command can only be used in a server.")
         return
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    title = f"💬 Top 10 Messages by {'`' + emoji + '` ' if emoji else ''}Reactions"
     if emoji:
-        cursor.execute('''
+        embed = await leaderboard_embed(ctx.command.name, '''
             SELECT
                 m.message_id,
                 u.username,
                 u.discriminator,
-                SUM(CASE WHEN re.event_type = 'add' THEN 1 ELSE -1 END) AS reaction_count
+                SUM(mrc.count) AS reaction_count
             FROM
-                reaction_events re
+                message_reaction_counts mrc
             JOIN
-                messages m ON re.message_id = m.message_id
+                messages m ON mrc.message_id = m.message_id
             JOIN
                 users u ON m.author_id = u.user_id
             WHERE
-                re.guild_id = ? AND re.emoji_name = ?
+                mrc.guild_id = ? AND mrc.emoji_key IN (SELECT emoji_key FROM emojis WHERE emoji_name = ?)
             GROUP BY
                 m.message_id
             ORDER BY
                 reaction_count DESC
             LIMIT 10
-        ''', (ctx.guild.id, emoji))
+        ''', (ctx.guild.id, emoji),
+            title=title,
+            color=discord.Color.purple(),
+            row_formatter=_fmt_message_row
+        )
     else:
-        cursor.execute('''
+        embed = await leaderboard_embed(ctx.command.name, '''
             SELECT
                 m.message_id,
                 u.username,
                 u.discriminator,
-                SUM(CASE WHEN re.event_type = 'add' THEN 1 ELSE -1 END) AS reaction_count
+                SUM(mrc.count) AS reaction_count
             FROM
-                reaction_events re
+                message_reaction_counts mrc
             JOIN
-                messages m ON re.message_id = m.message_id
+                messages m ON mrc.message_id = m.message_id
             JOIN
                 users u ON m.author_id = u.user_id
             WHERE
-                re.guild_id = ?
+                mrc.guild_id = ?
             GROUP BY
                 m.message_id
             ORDER BY
                 reaction_count DESC
             LIMIT 10
-        ''', (ctx.guild.id,))
-    results = cursor.fetchall()
-    conn.close()
+        ''', (ctx.guild.id,),
+            title=title,
+            color=discord.Color.purple(),
+            row_formatter=_fmt_message_row
+        )
 
-    if not results:
+    if embed is None:
         await ctx.followup.send("No reaction data available yet for messages in this server.")
         return
-
-    title = f"💬 Top 10 Messages by {'`' + emoji + '` ' if emoji else ''}Reactions"
-    embed = discord.Embed(
-        title=title,
-        color=discord.Color.purple()
-    )
-    for i, (message_id, username, discriminator, reaction_count) in enumerate(results):
-        display_name = f"{username}#{discriminator}" if discriminator != "0" else username
-        embed.add_field(
-            name=f"#{i+1} by {display_name}",
-            value=f"Message ID: `{message_id}`\nReactions: {reaction_count}",
-            inline=False
-        )
     await ctx.followup.send(embed=embed)
 
+# --- Run the Bot ---
+
 if __name__ == "__main__":
-    import asyncio
-    nest_asyncio.apply()
+    if not DISCORD_BOT_TOKEN:
+        print("ERROR: DISCORD_BOT_TOKEN environment variable not set.")
+        print("Please set the 'DISCORD_BOT_TOKEN' environment variable with your actual bot token.")
+        print("Example (Linux/macOS): export DISCORD_BOT_TOKEN='YOUR_NEW_TOKEN_HERE'")
+        print("Example (Windows Cmd): set DISCORD_BOT_TOKEN=YOUR_NEW_TOKEN_HERE")
+        print("Example (Windows PowerShell): $env:DISCORD_BOT_TOKEN='YOUR_NEW_TOKEN_HERE'")
+        print("You can get a new token from the Discord Developer Portal after resetting the old one.")
+        sys.exit(1)
     asyncio.run(bot.start(DISCORD_BOT_TOKEN))
 
 